@@ -1040,7 +1040,10 @@ variable "lambda_architecture" {
 variable "lambda_memory_size" {
   description = "The amount of memory in MB for the Lambda function."
   type        = number
-  default     = 256
+  # Must cover the image processor's parallel in-memory pipeline; keep in
+  # sync with the lambda_images module default (see MAX_WORKERS in
+  # image_processor.py for the sizing assumption).
+  default = 1024
 }
 
 variable "lambda_timeout" {
@@ -86,7 +86,8 @@ data "aws_iam_policy_document" "lambda_core_permissions" {
     sid    = "AllowWriteToDynamoDB"
     effect = "Allow"
     actions = [
-      "dynamodb:PutItem"
+      "dynamodb:PutItem",
+      "dynamodb:BatchWriteItem"
     ]
     resources = [var.dynamodb_table_arn]
   }
@@ -106,7 +107,8 @@ data "aws_iam_policy_document" "lambda_core_permissions" {
     sid    = "AllowWriteToDestinationS3"
     effect = "Allow"
     actions = [
-      "s3:PutObject"
+      "s3:PutObject",
+      "s3:AbortMultipartUpload"
     ]
     resources = ["arn:aws:s3:::${var.source_s3_bucket_name}/${var.destination_s3_prefix}*"]
   }
@@ -77,6 +77,30 @@ resource "aws_lambda_event_source_mapping" "sqs_trigger" {
   event_source_arn = var.sqs_trigger_queue_arn
   function_name    = aws_lambda_function.image_processor.arn
   batch_size       = var.sqs_batch_size
+
+  # Only deliver messages for objects under the source prefix. Anything else -
+  # destination-prefix objects that would loop the pipeline, or
+  # non-notification messages such as s3:TestEvent - is discarded by the
+  # Lambda service without a billed invocation. Event source mappings support
+  # only a subset of the EventBridge matchers, so this uses a plain positive
+  # 'prefix' match. Note: keys in S3 notifications are URL-encoded, so the
+  # configured prefix must not rely on spaces or non-ASCII characters. The
+  # function keeps its own prefix check as a second line of defense.
+  filter_criteria {
+    filter {
+      pattern = jsonencode({
+        body = {
+          Records = {
+            s3 = {
+              object = {
+                key = [{ prefix = var.source_s3_prefix }]
+              }
+            }
+          }
+        }
+      })
+    }
+  }
 }
 
 # --- Cleanup on Destroy --- #
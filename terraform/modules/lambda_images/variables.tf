@@ -54,7 +54,10 @@ variable "lambda_runtime" {
 variable "lambda_memory_size" {
   description = "The amount of memory in MB to allocate to the function."
   type        = number
-  default     = 256 # Image processing can be memory-intensive
+  # Image processing is memory-intensive: the function processes up to 8
+  # records in parallel, each holding the source bytes, the decoded raster
+  # and the encoded output in memory (see MAX_WORKERS in image_processor.py).
+  default = 1024
 }
 
 variable "lambda_timeout" {